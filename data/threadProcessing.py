@@ -1,3 +1,5 @@
+import re
+import zlib
 import pandas as pd
 import numpy as np
 import scipy.stats
@@ -180,12 +182,108 @@ def updateThreadObjectsWithtSNEEmbeddingCoordinates(threadObjectDF, proxyValues)
     return threadObjectDF
 
 
+##### Near-duplicate thread detection with MinHash signatures and LSH banding ####
+
+# Mersenne prime used for the universal hash family of the MinHash permutations
+minHashPrime = (1 << 31) - 1
+
+# strips the reply/forward prefixes so that "RE: x" and "FW: x" shingle like "x"
+subjectPrefixPattern = re.compile(r'^\s*((re|fw|fwd)\s*:\s*)+', re.IGNORECASE)
+
+# returns the lowercased word tokens of a subject line, without reply/forward prefixes
+def getSubjectTokens(subject):
+    return re.findall(r'\w+', subjectPrefixPattern.sub('', subject or '').lower())
+
+# returns the word n-gram shingles of a message body
+def getBodyShingles(body, shingleSize=3):
+    words = re.findall(r'\w+', body.lower())
+    return [' '.join(words[i:i + shingleSize]) for i in range(max(1, len(words) - shingleSize + 1))]
+
+# returns the set of shingles describing a thread: its participants, its subject words and,
+# per message, the body shingles when a body is available or the message ID otherwise
+def getThreadShingles(thread):
+    shingles = set()
+    for message in thread["messages"]:
+        shingles.add('p:' + message['sender'])
+        shingles.update('p:' + email for email in getSetOfRecipients(message))
+        shingles.update('s:' + token for token in getSubjectTokens(message.get('subject')))
+        if message.get('body'):
+            shingles.update('b:' + shingle for shingle in getBodyShingles(message['body']))
+        else:
+            shingles.add('m:' + message['messageId'])
+    return shingles
+
+# computes a (numberOfThreads x numberOfHashes) matrix of MinHash signatures, one row per thread
+def computeMinHashSignatures(threadShingles, numberOfHashes=100, seed=0):
+    randomState = np.random.RandomState(seed)
+    a = randomState.randint(1, minHashPrime, size=numberOfHashes).astype(np.uint64)
+    b = randomState.randint(0, minHashPrime, size=numberOfHashes).astype(np.uint64)
+    signatures = np.full((len(threadShingles), numberOfHashes), minHashPrime, dtype=np.uint64)
+    for index, shingles in enumerate(threadShingles):
+        if not shingles:
+            continue
+        # crc32 rather than hash() so that signatures are stable across runs
+        hashedShingles = np.asarray([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64) % minHashPrime
+        signatures[index] = ((np.outer(hashedShingles, a) + b) % minHashPrime).min(axis=0)
+    return signatures
+
+# finds candidate pairs of threads whose signatures agree on at least one whole band
+def findCandidatePairsWithLSH(signatures, numberOfBands=20):
+    rowsPerBand = signatures.shape[1] // numberOfBands
+    candidatePairs = set()
+    for band in range(numberOfBands):
+        buckets = {}
+        bandSignatures = signatures[:, band * rowsPerBand:(band + 1) * rowsPerBand]
+        for index, bandSignature in enumerate(bandSignatures):
+            buckets.setdefault(bandSignature.tobytes(), []).append(index)
+        for bucket in buckets.values():
+            for i in range(len(bucket)):
+                for j in range(i + 1, len(bucket)):
+                    candidatePairs.add((bucket[i], bucket[j]))
+    return candidatePairs
+
+# groups threads into clusters of near-duplicates; returns for each thread the index of its cluster representative
+# (the first thread of the cluster in the collection order). Candidates from LSH are only merged if their
+# estimated Jaccard similarity (the fraction of agreeing MinHashes) reaches the similarity threshold
+def findNearDuplicateClusters(threadShingles, similarityThreshold=0.8, numberOfHashes=100, numberOfBands=20, seed=0):
+    signatures = computeMinHashSignatures(threadShingles, numberOfHashes, seed)
+    # union-find over the thread indices, keeping the smallest index as the root
+    parents = list(range(len(threadShingles)))
+    def findRoot(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+    for i, j in findCandidatePairsWithLSH(signatures, numberOfBands):
+        if np.mean(signatures[i] == signatures[j]) >= similarityThreshold:
+            rootI, rootJ = findRoot(i), findRoot(j)
+            parents[max(rootI, rootJ)] = min(rootI, rootJ)
+    return np.asarray([findRoot(index) for index in range(len(threadShingles))])
+
+# tags every thread with the threadId of its cluster representative, which the server uses to propagate labels to the whole cluster
+def updateThreadObjectsWithDuplicateClusters(threadObjectDF, similarityThreshold=0.8):
+    threadShingles = [getThreadShingles(row) for index, row in threadObjectDF.iterrows()]
+    representatives = findNearDuplicateClusters(threadShingles, similarityThreshold)
+    threadObjectDF["clusterId"] = np.asarray(threadObjectDF["threadId"])[representatives]
+    return threadObjectDF
+
+# keeps only the representative of each near-duplicate cluster, alternative to tagging when duplicates should not be shown at all
+def collapseDuplicateThreads(threadObjectDF):
+    return threadObjectDF[threadObjectDF["threadId"] == threadObjectDF["clusterId"]].reset_index(drop=True)
+###################################
+
+
 def main():
     # Load the email data objects
     inputFileName = "threads-300-set2"
     fileExtension = ".json"
     print(inputFileName + fileExtension)
     threadObjects = pd.read_json(inputFileName + fileExtension)
+    # either tag near-duplicate threads with a shared clusterId or keep one representative per cluster
+    collapseDuplicates = False
+    threadObjects = updateThreadObjectsWithDuplicateClusters(threadObjects)
+    if collapseDuplicates:
+        threadObjects = collapseDuplicateThreads(threadObjects)
 
     threadObjects.head()
     givenThreadMeasureNames = ["threadID"]
@@ -95,7 +95,16 @@ def loadOrCreateModel(pkl_model_filename):
         print("building a new model")
     return lp_model
 
-def identifyItemsTolabel(lp_model, numberOfSamples, indecesOfUnLabelledIDs):
+def propagateLabelsToDuplicateClusters(y_train, allClusterIDs):
+    """Gives unlabelled threads the label of a labelled thread from the same near-duplicate cluster"""
+    # clusters are computed in the data pipeline, see updateThreadObjectsWithDuplicateClusters in data/threadProcessing.py
+    labelledIndices = np.where(y_train != -1)[0]
+    clusterLabels = dict(zip(allClusterIDs[labelledIndices], y_train[labelledIndices]))
+    for index in np.where(y_train == -1)[0]:
+        y_train[index] = clusterLabels.get(allClusterIDs[index], -1)
+    return y_train
+
+def identifyItemsTolabel(lp_model, numberOfSamples, indecesOfUnLabelledIDs, allClusterIDs=None):
     """This is sampling procedure to choose records for the AL loop"""
     # Currently using an uncertainty criteria
     # We can adapt ModAL here for a richer selection of strategies
@@ -107,7 +116,14 @@ def identifyItemsTolabel(lp_model, numberOfSamples, indecesOfUnLabelledIDs):
     # select up to 5 digit examples that the classifier is most uncertain about
     uncertainty_index = np.argsort(pred_entropies)[::-1]
     uncertainty_index = uncertainty_index[
-                            np.in1d(uncertainty_index, indecesOfUnLabelledIDs)][:numberOfSamples]
+                            np.in1d(uncertainty_index, indecesOfUnLabelledIDs)]
+
+    # recommend at most one thread per near-duplicate cluster, the most uncertain one
+    if allClusterIDs is not None:
+        _, firstOfCluster = np.unique(allClusterIDs[uncertainty_index], return_index=True)
+        uncertainty_index = uncertainty_index[np.sort(firstOfCluster)]
+
+    uncertainty_index = uncertainty_index[:numberOfSamples]
 
     return list(uncertainty_index)
 
@@ -153,6 +169,12 @@ def performThreadModelling(model_name, newThreadLabelObjects):
     y_train = np.full(len(allThreadIDs), -1)
     # and fill those labelled ones
     y_train[indecesOfLabelledIDs] = cumulativeThreadClassLabels
+
+    # a label on a thread also holds for its near-duplicates, if the data file has been deduplicated
+    allClusterIDs = np.asarray(threadObjects['clusterId']) if 'clusterId' in threadObjects.columns else None
+    if allClusterIDs is not None:
+        y_train = propagateLabelsToDuplicateClusters(y_train, allClusterIDs)
+        indecesOfLabelledIDs = np.where(y_train != -1)[0]
     # training set is now ready
 
     lp_model = loadOrCreateModel(pkl_model_filename)
@@ -182,7 +204,7 @@ def performThreadModelling(model_name, newThreadLabelObjects):
     results_dictionary = dict(zip(allThreadIDs.tolist(), all_predicted_labels.tolist()))
     print("Results::: ", results_dictionary)
 
-    recommended_thread_IDs_for_labelling = identifyItemsTolabel(lp_model, numberOfItemsToLabel, indecesOfUnLabelledIDs)
+    recommended_thread_IDs_for_labelling = identifyItemsTolabel(lp_model, numberOfItemsToLabel, indecesOfUnLabelledIDs, allClusterIDs)
     recommended_threads_for_labelling = allThreadIDs[recommended_thread_IDs_for_labelling].tolist()
 
     return results_dictionary, recommended_threads_for_labelling